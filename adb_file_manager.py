@@ -14,12 +14,26 @@ import traceback
 import platform
 import string
 import ctypes
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+import shlex
+import threading
+import queue
+import select
+import stat
+import struct
+import hashlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
 import cgi
+import argparse
+import sys
 
 PORT = 8765
 IS_WINDOWS = platform.system() == 'Windows'
+GLOBAL_BW_LIMIT = 0   # bytes/s across all transfers, 0 = unlimited
+DEVICE_BW_LIMIT = 0   # bytes/s per device, 0 = unlimited
 
 # -----------------------
 # EMBEDDED HTML & CSS
@@ -233,6 +247,9 @@ h1 {
 .btn-pull { background-color: transparent; color: var(--teal-bright); border: 2px solid var(--teal); }
 .btn-pull:hover:not(:disabled) { background-color: var(--teal-surface); color: #fff; }
 
+.verify-toggle { display: flex; align-items: center; gap: 8px; color: var(--text-muted); font-size: 13px; font-weight: 600; cursor: pointer; }
+.verify-toggle input { accent-color: var(--teal); }
+
 .terminal {
   height: 100px; background: rgba(0,0,0,0.5); border-radius: var(--radius-sm); border: 1px solid var(--border);
   padding: 10px; font-family: 'Consolas', monospace; font-size: 11px; color: var(--text-muted); overflow-y: auto;
@@ -262,6 +279,7 @@ h1 {
           <input id="linuxPath" class="path-input" value="__HOME__" aria-label="Local Path">
           <button class="nav-btn" id="linuxGo">Go</button>
           <button class="nav-btn" id="linuxUp">⬆</button>
+          <button class="nav-btn" id="linuxDu" title="Folder sizes (Shift+click rescans edited files)">Σ</button>
         </div>
       </div>
       <div class="list-viewport" id="linuxViewport" data-type="linux">
@@ -276,6 +294,7 @@ h1 {
           <input id="androidPath" class="path-input" value="/sdcard/" aria-label="Android Path">
           <button class="nav-btn" id="androidGo">Go</button>
           <button class="nav-btn" id="androidUp">⬆</button>
+          <button class="nav-btn" id="androidDu" title="Folder sizes">Σ</button>
         </div>
       </div>
       <div class="list-viewport" id="androidViewport" data-type="android">
@@ -288,6 +307,7 @@ h1 {
     <button id="pushBtn" class="btn-action btn-push" onclick="pushToAndroid()" disabled><span>➡</span> PUSH TO DEVICE</button>
     <button id="pullBtn" class="btn-action btn-pull" onclick="pullFromAndroid()" disabled><span>⬅</span> PULL TO HOST</button>
     <button id="installBtn" class="btn-action btn-pull" onclick="installApk()" style="display:none"><span>📦</span> INSTALL</button>
+    <label class="verify-toggle"><input type="checkbox" id="verifyChk"> VERIFY</label>
   </div>
 
   <div class="terminal" id="log">
@@ -300,6 +320,7 @@ const ITEM_HEIGHT = 60;
 const BUFFER_ITEMS = 10;
 const DEBOUNCE_MS = 150;
 const IS_WINDOWS = "__PLATFORM__" === "Windows";
+const CLIENT_ID = Math.random().toString(36).slice(2);
 
 let selectedLinux = new Map(); 
 let selectedAndroid = new Map();
@@ -343,7 +364,7 @@ function createFileNode(f, type){
     <div class="file-icon">${iconFor(f)}</div>
     <div class="file-info">
       <div class="file-name">${f.name}</div>
-      <div class="file-meta">${f.is_dir ? (f.is_drive ? 'Drive' : 'Folder') : humanSize(f.size)} ${f.modified !== '-' ? '• '+f.modified : ''}</div>
+      <div class="file-meta">${f.is_dir ? (f.is_drive ? 'Drive' : (f.du_size !== undefined ? humanSize(f.du_size) : 'Folder')) : humanSize(f.size)} ${f.modified !== '-' ? '• '+f.modified : ''}</div>
     </div>
   `;
   node._file = f;
@@ -483,9 +504,52 @@ async function loadLinux(){
     vp.innerHTML = '<div id="linuxPhantom"></div>';
     selectedLinux.clear(); updateButtons();
     setupVirtualList(vp, document.getElementById('linuxPhantom'), data.files, 'linux');
+    watchLinux(path);
   } catch(e) { log('Error Local: '+e.message); }
 }
 
+let linuxWatch = null;
+
+function watchLinux(path){
+  // Server pushes add/remove/modify deltas for the open directory
+  if(linuxWatch) linuxWatch.close();
+  linuxWatch = null;
+  if(IS_WINDOWS && (path === '/' || path === '')) return;
+  linuxWatch = new EventSource('/api/linux/watch?path='+encodeURIComponent(path));
+  linuxWatch.onmessage = (ev) => applyChanges('linux', JSON.parse(ev.data).changes);
+  linuxWatch.addEventListener('gone', (ev) => {
+    log(`${path} was deleted or moved`);
+    ev.target.close();
+    if(linuxWatch === ev.target) linuxWatch = null;
+  });
+  linuxWatch.onerror = () => { if(linuxWatch) linuxWatch.close(); linuxWatch = null; };
+}
+
+function applyChanges(type, changes){
+  const vp = document.getElementById(type+'Viewport');
+  const map = type==='linux' ? selectedLinux : selectedAndroid;
+  let items = vp._items.slice();
+  for(const c of changes){
+    const path = c.file ? c.file.path : c.path;
+    const idx = items.findIndex(f => f.name !== '..' && f.path === path);
+    if(c.op === 'remove'){
+      if(idx >= 0) items.splice(idx, 1);
+      map.delete(path);
+    } else if(idx >= 0){
+      if(items[idx].du_size !== undefined) c.file.du_size = items[idx].du_size;
+      items[idx] = c.file;
+    } else {
+      items.push(c.file);
+    }
+  }
+  const up = items.filter(f => f.name === '..');
+  const rest = items.filter(f => f.name !== '..');
+  rest.sort((a, b) => (a.is_dir === b.is_dir) ? a.name.toLowerCase().localeCompare(b.name.toLowerCase()) : (a.is_dir ? -1 : 1));
+  for(const node of vp._pool.values()) node.remove();
+  setupVirtualList(vp, document.getElementById(type+'Phantom'), up.concat(rest), type);
+  updateButtons();
+}
+
 async function loadAndroid(){
   const path = document.getElementById('androidPath').value;
   try {
@@ -497,14 +561,49 @@ async function loadAndroid(){
   } catch(e) { log('Error Android: '+e.message); }
 }
 
+let duSource = {};
+
+function loadSizes(type, refresh){
+  // Streams recursive folder sizes and patches matching cards as they arrive
+  const path = document.getElementById(type+'Path').value;
+  const vp = document.getElementById(type+'Viewport');
+  if(duSource[type]) duSource[type].close();
+  const es = new EventSource(`/api/${type}/du?stream=1${refresh ? '&refresh=1' : ''}&path=`+encodeURIComponent(path));
+  duSource[type] = es;
+  es.onmessage = (ev) => {
+    const d = JSON.parse(ev.data);
+    const idx = (vp._items||[]).findIndex(f => f.is_dir && f.name !== '..' && f.path.replace(/\\/+$/,'') === d.path.replace(/\\/+$/,''));
+    if(idx < 0) return;
+    const f = vp._items[idx];
+    f.du_size = d.size;
+    const node = vp._pool && vp._pool.get(idx);
+    if(node) node.querySelector('.file-meta').textContent = humanSize(d.size) + (f.modified !== '-' ? ' • '+f.modified : '');
+  };
+  es.addEventListener('done', (ev) => { log(`${path}: ${humanSize(JSON.parse(ev.data).total)} total`); es.close(); });
+  es.onerror = (ev) => { if(ev.data) log('Size Error: '+JSON.parse(ev.data).error); es.close(); };
+}
+
+async function preflight(direction, items){
+  try {
+    const r = await fetch('/api/preflight', { method:'POST', body:JSON.stringify({direction, items}) });
+    return (await r.json()).total_bytes || 0;
+  } catch(e){ return 0; }
+}
+
 const debouncedLoadLinux = debounce(loadLinux, DEBOUNCE_MS);
 const debouncedLoadAndroid = debounce(loadAndroid, DEBOUNCE_MS);
 
+function logStats(res){
+  if(res.transfer) log(`Transfer: ${humanSize(res.transfer.bytes)} in ${res.transfer.seconds}s (${res.transfer.mb_per_s} MB/s)`);
+  if(res.verify) log(`Verify (${res.verify.algo}): ${res.verify.files} files, ${humanSize(res.verify.bytes_hashed)} hashed in ${res.verify.seconds}s (${res.verify.mb_per_s} MB/s), ${res.verify.mismatches.length} mismatches`);
+}
+
 async function pushToAndroid(){
   if(selectedLinux.size===0) return;
   const srcItems = Array.from(selectedLinux.values());
   const destPath = document.getElementById('androidPath').value;
-  log(`Pushing ${srcItems.length} items to ${destPath}...`);
+  const total = await preflight('push', srcItems.map(f => ({source: f.path})));
+  log(`Pushing ${srcItems.length} items (${humanSize(total)}) to ${destPath}...`);
   
   const payload = {
     items: srcItems.map(f => ({
@@ -512,13 +611,17 @@ async function pushToAndroid(){
       dest: destPath + (destPath.endsWith('/')?'':'/') + f.name,
       is_dir: f.is_dir,
       name: f.name
-    }))
+    })),
+    verify: document.getElementById('verifyChk').checked,
+    client: CLIENT_ID,
+    priority: (srcItems.length === 1 && !srcItems[0].is_dir) ? 'interactive' : 'normal'
   };
   
   try {
     const r = await fetch('/api/push', { method:'POST', body:JSON.stringify(payload) });
     const res = await r.json();
     if(res.success) log('Push Success.'); else log('Push Failed: '+JSON.stringify(res.errors));
+    logStats(res);
     debouncedLoadAndroid();
   } catch(e){ log('Push Error: '+e); }
 }
@@ -527,7 +630,8 @@ async function pullFromAndroid(){
   if(selectedAndroid.size===0) return;
   const srcItems = Array.from(selectedAndroid.values());
   const destPath = document.getElementById('linuxPath').value;
-  log(`Pulling ${srcItems.length} items to ${destPath}...`);
+  const total = await preflight('pull', srcItems.map(f => ({source: f.path})));
+  log(`Pulling ${srcItems.length} items (${humanSize(total)}) to ${destPath}...`);
   
   const payload = {
     items: srcItems.map(f => ({
@@ -535,14 +639,18 @@ async function pullFromAndroid(){
       dest: destPath + (destPath.endsWith('/')?'':'/') + f.name,
       is_dir: f.is_dir,
       name: f.name
-    }))
+    })),
+    verify: document.getElementById('verifyChk').checked,
+    client: CLIENT_ID,
+    priority: (srcItems.length === 1 && !srcItems[0].is_dir) ? 'interactive' : 'normal'
   };
 
   try {
     const r = await fetch('/api/pull', { method:'POST', body:JSON.stringify(payload) });
     const res = await r.json();
     if(res.success) log('Pull Success.'); else log('Pull Failed: '+JSON.stringify(res.errors));
-    debouncedLoadLinux();
+    logStats(res);
+    if(!linuxWatch) debouncedLoadLinux();
   } catch(e){ log('Pull Error: '+e); }
 }
 
@@ -576,6 +684,8 @@ window.onload = function(){
   document.getElementById('linuxUp').onclick = () => goUp('linux');
   document.getElementById('androidGo').onclick = debouncedLoadAndroid;
   document.getElementById('androidUp').onclick = () => goUp('android');
+  document.getElementById('linuxDu').onclick = (e) => loadSizes('linux', e.shiftKey);
+  document.getElementById('androidDu').onclick = () => loadSizes('android');
 
   debouncedLoadLinux();
   debouncedLoadAndroid();
@@ -587,6 +697,982 @@ window.onload = function(){
 </html>
 """
 
+# -----------------------
+# DISK USAGE
+# -----------------------
+DU_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+DU_CACHE_MAX = 200000   # directories remembered, least recently used go first
+_du_cache = OrderedDict()   # local dir -> (mtime_ns, own_bytes, [subdirs])
+_du_lock = threading.Lock()
+
+def to_local_path(path):
+    # Frontend paths always use '/', the os module on Windows wants '\\'
+    if not IS_WINDOWS: return path
+    local = path.replace('/', '\\')
+    if len(local) == 2 and local[1] == ':': local += '\\'
+    return local
+
+def _du_scan(path, refresh=False):
+    """Bytes of the files directly inside `path` plus its subdirectories.
+    Cached per directory and reused while the directory mtime is unchanged.
+    That mtime only moves when entries are added, removed or renamed, so a
+    file rewritten in place keeps its old size until refresh=True."""
+    try: mtime = os.stat(path).st_mtime_ns
+    except OSError: return 0, []
+    with _du_lock:
+        hit = _du_cache.get(path)
+        if hit: _du_cache.move_to_end(path)
+    if hit and hit[0] == mtime and not refresh: return hit[1], hit[2]
+    own, subdirs = 0, []
+    try:
+        with os.scandir(path) as it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False): subdirs.append(e.path)
+                    else: own += e.stat(follow_symlinks=False).st_size
+                except OSError: continue
+    except OSError: pass
+    with _du_lock:
+        _du_cache[path] = (mtime, own, subdirs)
+        _du_cache.move_to_end(path)
+        while len(_du_cache) > DU_CACHE_MAX: _du_cache.popitem(last=False)
+    return own, subdirs
+
+def du_local(path, on_entry=None, refresh=False):
+    """Recursive size of a local directory. Every directory found anywhere in
+    the tree becomes its own pool task, so one huge child is still walked in
+    parallel; on_entry(path, bytes) fires as each top-level child finishes."""
+    own, subdirs = _du_scan(path, refresh)
+    if not subdirs: return own, {}
+    totals = {d: 0 for d in subdirs}
+    pending = {d: 1 for d in subdirs}   # directories of each child not scanned yet
+    lock, finished = threading.Lock(), queue.Queue()
+    pool = ThreadPoolExecutor(DU_WORKERS)
+
+    def scan(top, d):
+        n, subs = _du_scan(d, refresh)
+        with lock:
+            totals[top] += n
+            pending[top] += len(subs) - 1
+            done = pending[top] == 0
+        try:
+            for sub in subs: pool.submit(scan, top, sub)
+        except RuntimeError: return   # pool shut down, the caller gave up
+        if done: finished.put(top)
+
+    children = {}
+    try:
+        for d in subdirs: pool.submit(scan, d, d)
+        for _ in subdirs:
+            top = finished.get()
+            name = top.replace("\\", "/")
+            children[name] = totals[top]
+            if on_entry: on_entry(name, children[name])
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return own + sum(children.values()), children
+
+def du_local_total(paths):
+    total = 0
+    for p in paths:
+        p = to_local_path(p)
+        if os.path.isdir(p): total += du_local(p)[0]
+        else:
+            try: total += os.path.getsize(p)
+            except OSError: pass
+    return total
+
+def _adb_du_script(path):
+    # toybox du only gained -b recently, fall back to 1K blocks on older images.
+    # -H follows symlinked arguments such as /sdcard -> /storage/self/primary
+    q = shlex.quote(path)
+    return (f"if du -b -d 0 /dev/null >/dev/null 2>&1; then echo B; du -b -H -d 1 {q} 2>/dev/null; "
+            f"else echo K; du -k -H -d 1 {q} 2>/dev/null; fi")
+
+def _parse_du_line(line, unit):
+    size, _, name = line.partition('\t')
+    if not name or not size.strip().isdigit(): return None, 0
+    return name.strip(), int(size) * (1024 if unit == 'K' else 1)
+
+def du_android(path, on_entry=None):
+    """Recursive size of a device directory from a single `du -d 1` call.
+    du prints each child as it finishes, so entries stream while it runs.
+    Not cached: proving a device tree unchanged would cost a walk of its own."""
+    path = path.rstrip('/') or '/'
+    proc = subprocess.Popen(['adb', 'shell', _adb_du_script(path)],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    total, children = 0, {}
+    try:
+        unit = proc.stdout.readline().strip()
+        for line in proc.stdout:
+            name, size = _parse_du_line(line, unit)
+            if name is None: continue
+            if name.rstrip('/') == path:
+                total = size
+                continue
+            children[name] = size
+            if on_entry: on_entry(name, size)
+    finally:
+        # A client that went away stops the device walk too
+        proc.kill()
+        proc.wait()
+    return total, children
+
+def du_android_sizes(paths):
+    """File bytes under each device path, {path: bytes}, from one shell call.
+    Only regular files count (du would add directory entries), so the totals
+    match du_local_total and the bytes a transfer actually moves."""
+    if not paths: return {}
+    script = '; '.join(f"echo @; find -H {shlex.quote(p)} -type f -exec stat -c %s {{}} + 2>/dev/null"
+                       for p in paths)
+    r = subprocess.run(['adb', 'shell', script], capture_output=True, text=True)
+    sizes, i = {}, -1
+    for line in r.stdout.splitlines():
+        line = line.strip()
+        if line == '@':
+            i += 1
+            sizes[paths[i]] = 0
+        elif line.isdigit() and i >= 0:
+            sizes[paths[i]] += int(line)
+    return sizes
+
+def du_android_total(paths):
+    return sum(du_android_sizes(paths).values())
+
+# -----------------------
+# DIRECTORY WATCHER
+# -----------------------
+WATCH_POLL_SECONDS = 2.0
+WATCH_KEEPALIVE_SECONDS = 15
+WATCH_BATCH_SECONDS = 0.2
+
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x2, 0x4, 0x8
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x40, 0x80, 0x100, 0x200
+IN_DELETE_SELF, IN_MOVE_SELF, IN_Q_OVERFLOW, IN_IGNORED = 0x400, 0x800, 0x4000, 0x8000
+IN_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                 | IN_DELETE_SELF | IN_MOVE_SELF)
+IN_GONE = IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED
+
+def local_entry(name, path, st):
+    return {
+        'name': name,
+        'is_dir': stat.S_ISDIR(st.st_mode),
+        'is_drive': False,
+        'size': st.st_size,
+        'modified': time.strftime('%Y-%m-%d %H:%M', time.localtime(st.st_mtime)),
+        'path': path.replace("\\", "/") # Normalize back to / for frontend
+    }
+
+class DirWatcher:
+    """One watch per open local directory, shared by every client viewing it.
+    Directories are keyed by their real path, so a symlinked alias shares the
+    watch and each subscriber gets deltas under the path it asked for.
+    Uses inotify on Linux and falls back to periodic rescans elsewhere; both
+    produce add/remove/modify deltas on each subscriber's queue, and a final
+    {'op': 'gone'} once the directory itself is deleted or moved away."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dirs = {}   # real dir -> {'subs': {queue: path as requested}, 'snap': {name: stat key}, 'wd': int}
+        self.wds = {}    # inotify wd -> set of real dirs (bind mounts can share one)
+        self.subs = {}   # queue -> real dir
+        self.libc = None
+        self.fd = self._inotify_init()
+        self.thread = None
+
+    def _inotify_init(self):
+        if platform.system() != 'Linux': return None
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0: return None
+        self.libc = libc
+        return fd
+
+    def subscribe(self, path):
+        q = queue.Queue()
+        real = os.path.realpath(path)
+        with self.lock:
+            d = self.dirs.get(real)
+            if d is None:
+                d = {'subs': {}, 'snap': self._snapshot(real), 'wd': -1}
+                if self.fd is not None:
+                    d['wd'] = self.libc.inotify_add_watch(self.fd, os.fsencode(real), IN_WATCH_MASK)
+                    if d['wd'] >= 0: self.wds.setdefault(d['wd'], set()).add(real)
+                self.dirs[real] = d
+            d['subs'][q] = path
+            self.subs[q] = real
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            real = self.subs.pop(q, None)
+            d = self.dirs.get(real)
+            if d is None: return   # already dropped when the directory went away
+            del d['subs'][q]
+            if d['subs']: return
+            del self.dirs[real]
+            self._release(real, d['wd'])
+
+    def _release(self, real, wd):
+        # Called with self.lock held, the kernel watch goes once no directory uses it
+        reals = self.wds.get(wd)
+        if reals is None: return
+        reals.discard(real)
+        if reals: return
+        del self.wds[wd]
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def _gone(self, real):
+        # Called with self.lock held, ends every stream on a deleted directory
+        d = self.dirs.pop(real)
+        for q in d['subs']:
+            self.subs.pop(q, None)
+            q.put({'op': 'gone'})
+        if d['wd'] >= 0: self._release(real, d['wd'])
+
+    def _snapshot(self, path):
+        snap = {}
+        try:
+            with os.scandir(path) as it:
+                for e in it:
+                    try: snap[e.name] = self._key(e.stat())
+                    except OSError: continue
+        except OSError: pass
+        return snap
+
+    @staticmethod
+    def _key(st):
+        return (stat.S_ISDIR(st.st_mode), st.st_size, st.st_mtime_ns)
+
+    def _emit(self, d, op, name):
+        full = os.path.join(d, name)
+        if op != 'remove':
+            try: st = os.stat(full)
+            except OSError: return
+        for q, path in self.dirs[d]['subs'].items():
+            shown = os.path.join(path, name)
+            if op == 'remove': q.put({'op': op, 'name': name, 'path': shown.replace("\\", "/")})
+            else: q.put({'op': op, 'file': local_entry(name, shown, st)})
+
+    def _update(self, d, name):
+        # Called with self.lock held, re-stats a single entry reported by inotify
+        snap = self.dirs[d]['snap']
+        try: key = self._key(os.stat(os.path.join(d, name)))
+        except OSError: key = None
+        old = snap.get(name)
+        if key == old: return
+        if key is None:
+            del snap[name]
+            self._emit(d, 'remove', name)
+        else:
+            snap[name] = key
+            self._emit(d, 'add' if old is None else 'modify', name)
+
+    def _rescan(self, d):
+        # Called with self.lock held, diffs the whole directory against its snapshot
+        if not os.path.isdir(d):
+            self._gone(d)
+            return
+        old, new = self.dirs[d]['snap'], self._snapshot(d)
+        self.dirs[d]['snap'] = new
+        for name in old.keys() - new.keys(): self._emit(d, 'remove', name)
+        for name, key in new.items():
+            if name not in old: self._emit(d, 'add', name)
+            elif old[name] != key: self._emit(d, 'modify', name)
+
+    def _run(self):
+        while True:
+            if self.fd is None:
+                time.sleep(WATCH_POLL_SECONDS)
+                with self.lock:
+                    for d in list(self.dirs): self._rescan(d)
+                continue
+            ready, _, _ = select.select([self.fd], [], [], WATCH_POLL_SECONDS)
+            if not ready: continue
+            try: buf = os.read(self.fd, 65536)
+            except BlockingIOError: continue
+            with self.lock:
+                off = 0
+                while off < len(buf):
+                    wd, mask, _, n = struct.unpack_from('iIII', buf, off)
+                    name = os.fsdecode(buf[off + 16:off + 16 + n].rstrip(b'\0'))
+                    off += 16 + n
+                    if mask & IN_Q_OVERFLOW:
+                        for d in list(self.dirs): self._rescan(d)
+                        break
+                    if mask & IN_GONE:
+                        # The kernel drops the watch itself, only our bookkeeping goes
+                        for d in self.wds.pop(wd, ()):
+                            if d in self.dirs: self._gone(d)
+                        continue
+                    for d in self.wds.get(wd, ()):
+                        if d in self.dirs and name: self._update(d, name)
+
+WATCHER = DirWatcher()
+
+# -----------------------
+# TRANSFER VERIFICATION
+# -----------------------
+# hashlib drops the GIL while digesting large buffers, so threads scale here
+VERIFY_WORKERS = min(8, os.cpu_count() or 1)
+VERIFY_ALGOS = ('sha256', 'sha1', 'md5')   # hashlib names that also exist as toybox <algo>sum
+VERIFY_BATCH = 64          # device files hashed per `adb shell` call
+HASH_CHUNK = 1 << 20
+HASH_CACHE_MAX = 100000    # digests remembered, least recently used go first
+_hash_cache = OrderedDict()   # (local path, size, mtime_ns, algo) -> hex digest
+_hash_lock = threading.Lock()
+
+def check_algo(algo):
+    # algo ends up in an adb shell command line, so only known names get through
+    if algo not in VERIFY_ALGOS:
+        raise ValueError(f"Unsupported hash algorithm: {algo!r} (use one of {', '.join(VERIFY_ALGOS)})")
+
+def hash_local(path, algo='sha256', cache=True):
+    """(hex digest, bytes read). Pass cache=False for files that are about to
+    be deleted, such as temp downloads, so they don't crowd out real ones."""
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns, algo)
+    if cache:
+        with _hash_lock:
+            hit = _hash_cache.get(key)
+            if hit: _hash_cache.move_to_end(key)
+        if hit: return hit, 0
+    h = hashlib.new(algo)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''): h.update(chunk)
+    if cache:
+        with _hash_lock:
+            _hash_cache[key] = h.hexdigest()
+            while len(_hash_cache) > HASH_CACHE_MAX: _hash_cache.popitem(last=False)
+    return h.hexdigest(), st.st_size
+
+def hash_android(paths, algo='sha256'):
+    """Device-side digests, batching VERIFY_BATCH files into each shell call."""
+    check_algo(algo)
+    digests = {}
+    for i in range(0, len(paths), VERIFY_BATCH):
+        batch = ' '.join(shlex.quote(p) for p in paths[i:i + VERIFY_BATCH])
+        r = subprocess.run(['adb', 'shell', f'{algo}sum {batch} 2>/dev/null'], capture_output=True, text=True)
+        for line in r.stdout.splitlines():
+            digest, _, name = line.partition('  ')
+            if name: digests[name] = digest.strip().lower()
+    return digests
+
+def verify_pairs(op, src, dest):
+    # (local file, device file) for one finished unit, listed from its source
+    # side only so files already sitting in the destination are left out
+    if op == 'push':
+        local_root = to_local_path(src)
+        if not os.path.isdir(local_root): return [(local_root, dest)]
+        return [(os.path.join(local_root, *rel.split('/')), dest.rstrip('/') + '/' + rel) for rel in local_tree(src)]
+    local_root = to_local_path(dest)
+    if not os.path.isdir(local_root): return [(local_root, src)]
+    return [(os.path.join(local_root, *rel.split('/')), src.rstrip('/') + '/' + rel) for rel in android_tree(src)]
+
+def verify_transfer(pairs, algo='sha256'):
+    """Hashes the local files while the device hashes its copies, then compares.
+    Cached local digests count as zero bytes hashed."""
+    check_algo(algo)
+    start = time.time()
+    hashed = 0; mismatches = []
+    with ThreadPoolExecutor(VERIFY_WORKERS + 1) as pool:
+        remote = pool.submit(hash_android, [d for _, d in pairs], algo)
+        local = {pool.submit(hash_local, lp, algo): (lp, dp) for lp, dp in pairs}
+        local_digests = {}
+        for fut in as_completed(local):
+            try: digest, n = fut.result()
+            except (OSError, ValueError): digest, n = None, 0
+            local_digests[local[fut]] = digest
+            hashed += n
+        remote = remote.result()
+    for (lp, dp), digest in local_digests.items():
+        if digest is None or remote.get(dp) != digest:
+            mismatches.append({'local': lp.replace("\\", "/"), 'device': dp,
+                               'local_hash': digest, 'device_hash': remote.get(dp)})
+    elapsed = time.time() - start
+    return {'algo': algo, 'files': len(pairs), 'bytes_hashed': hashed, 'seconds': round(elapsed, 3),
+            'mb_per_s': round(hashed / 1048576 / elapsed, 2) if elapsed > 0 else 0,
+            'mismatches': mismatches}
+
+def throughput(nbytes, elapsed):
+    return {'bytes': nbytes, 'seconds': round(elapsed, 3),
+            'mb_per_s': round(nbytes / 1048576 / elapsed, 2) if elapsed > 0 else 0}
+
+# -----------------------
+# TRANSFER SCHEDULER
+# -----------------------
+PRIORITIES = {'interactive': 0, 'normal': 1, 'background': 2}
+TRANSFER_WORKERS = 2
+MANIFEST_WORKERS = TRANSFER_WORKERS * 4   # batch jobs listing/sizing while others transfer
+INTERACTIVE_MAX_BYTES = 1 << 20   # interactive units up to this size skip bandwidth pacing
+METER_WINDOW = 60.0               # seconds of recent transfers behind the per-device rate
+
+class AdbTransport:
+    """Moves one unit over adb. The scheduler only needs push/pull returning
+    (ok, error), so tests can swap in a throttled fake."""
+
+    # adb nests a folder copied onto an existing folder (dest/name/name), so
+    # folders go to the parent instead, which adb merges into dest/name
+
+    def push(self, src, dest):
+        name = dest.rstrip('/').rsplit('/', 1)
+        if os.path.isdir(src) and len(name) == 2 and name[1] == os.path.basename(src.rstrip('/\\')):
+            dest = (name[0] or '') + '/'
+        r = subprocess.run(['adb', 'push', src, dest], capture_output=True, text=True)
+        return r.returncode == 0, r.stderr
+
+    def pull(self, src, dest):
+        parent = os.path.dirname(dest)
+        if parent: os.makedirs(parent, exist_ok=True)
+        if os.path.isdir(dest) and parent and os.path.basename(dest) == src.rstrip('/').rsplit('/', 1)[-1]:
+            dest = parent
+        r = subprocess.run(['adb', 'pull', src, dest], capture_output=True, text=True)
+        return r.returncode == 0, r.stderr
+
+class RateLimiter:
+    """Paces bytes to `rate` bytes/s by reserving slots on a virtual clock.
+    A rate of 0 disables the limit. Pacing happens between units and each
+    unit then runs at full link speed, so the cap holds on average over
+    whole units, not within a single large file."""
+
+    def __init__(self, rate=0):
+        self.rate = rate
+        self.clock = 0.0
+        self.lock = threading.Lock()
+
+    def delay(self):
+        # Seconds until the next unit may start
+        with self.lock:
+            if self.rate <= 0: return 0.0
+            return max(0.0, self.clock - time.monotonic())
+
+    def charge(self, nbytes):
+        with self.lock:
+            if self.rate <= 0: return
+            self.clock = max(self.clock, time.monotonic()) + nbytes / self.rate
+
+class TransferJob:
+    def __init__(self, units, client, priority, device):
+        self.client, self.priority, self.device = client, priority, device
+        self.pending = len(units)
+        self.results = []   # (unit, ok, error)
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        if not units: self.done.set()
+
+    def finish(self, unit, ok, error):
+        with self.lock:
+            self.results.append((unit, ok, error))
+            self.pending -= 1
+            if self.pending == 0: self.done.set()
+
+class TransferScheduler:
+    """Runs transfer units on a small worker pool. Higher priority classes
+    always go first, clients within a class are served round-robin, and every
+    unit is paced by the global and per-device rate limits. A unit is only
+    handed to a worker once its limits allow it to start, so paced bulk work
+    never ties up a worker. Small interactive units (up to
+    INTERACTIVE_MAX_BYTES) are charged to the limits but never wait for them;
+    larger ones still go first but are paced like everything else. While
+    interactive work (e.g. a listing) is in flight no new queued unit is
+    started."""
+
+    def __init__(self, transport=None, workers=TRANSFER_WORKERS, global_limit=GLOBAL_BW_LIMIT, device_limit=DEVICE_BW_LIMIT):
+        self.transport = transport or AdbTransport()
+        self.cond = threading.Condition()
+        self.queues = [OrderedDict() for _ in PRIORITIES]   # per class: client -> deque of (job, unit)
+        self.inline = 0
+        self.global_limiter = RateLimiter(global_limit)
+        self.device_limit = device_limit
+        self.device_limiters = {}
+        self.meters = {}   # device -> deque of (start, end, bytes) from the last METER_WINDOW seconds
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    @property
+    def limited(self):
+        return self.global_limiter.rate > 0 or self.device_limit > 0
+
+    @staticmethod
+    def _check_limit(value):
+        if value is None: return None
+        try: value = int(value)
+        except (TypeError, ValueError): raise ValueError(f"Bandwidth limit must be an integer, got {value!r}")
+        if value < 0: raise ValueError(f"Bandwidth limit must be >= 0, got {value}")
+        return value
+
+    def set_limits(self, global_limit=None, device_limit=None):
+        global_limit, device_limit = self._check_limit(global_limit), self._check_limit(device_limit)
+        with self.cond:
+            if global_limit is not None: self.global_limiter.rate = global_limit
+            if device_limit is not None:
+                self.device_limit = device_limit
+                for lim in self.device_limiters.values(): lim.rate = device_limit
+            self.cond.notify_all()
+
+    def submit(self, units, client='local', priority='normal', device='default'):
+        """units: [(op, src, dest, nbytes)] with op 'push' or 'pull'."""
+        job = TransferJob(units, client, priority, device)
+        if not units: return job
+        with self.cond:
+            q = self.queues[PRIORITIES.get(priority, PRIORITIES['normal'])]
+            q.setdefault(client, deque()).extend((job, u) for u in units)
+            self.cond.notify_all()
+        return job
+
+    def run(self, units, **kwargs):
+        job = self.submit(units, **kwargs)
+        job.done.wait()
+        return job.results
+
+    @contextmanager
+    def interactive(self):
+        # Work done on the caller's thread that must not queue behind bulk units
+        with self.cond: self.inline += 1
+        try: yield
+        finally:
+            with self.cond:
+                self.inline -= 1
+                self.cond.notify_all()
+
+    def stats(self):
+        """Per-device throughput over transfers that ended in the last
+        METER_WINDOW seconds, so idle time between jobs doesn't dilute it."""
+        with self.cond:
+            out = {}
+            for device, samples in self.meters.items():
+                self._prune(samples)
+                if not samples: continue
+                nbytes = sum(n for _, _, n in samples)
+                out[device] = throughput(nbytes, max(e for _, e, _ in samples) - min(s for s, _, _ in samples))
+            queued = sum(len(dq) for q in self.queues for dq in q.values())
+            return {'global_limit': self.global_limiter.rate, 'device_limit': self.device_limit,
+                    'queued': queued, 'window': METER_WINDOW, 'devices': out}
+
+    @staticmethod
+    def _prune(samples):
+        # Samples are appended in end order, so old ones sit at the front
+        horizon = time.monotonic() - METER_WINDOW
+        while samples and samples[0][1] < horizon: samples.popleft()
+
+    def _next(self):
+        with self.cond:
+            while True:
+                timeout = None
+                for cls, q in enumerate(self.queues):
+                    if self.inline or not q: continue
+                    client, dq = next(iter(q.items()))
+                    job, unit = dq[0]
+                    try:
+                        limiters = (self.global_limiter, self._limiter(job.device))
+                        small = cls == PRIORITIES['interactive'] and unit[3] <= INTERACTIVE_MAX_BYTES
+                        wait = 0.0 if small else max(lim.delay() for lim in limiters)
+                        if wait > 0:
+                            timeout = wait if timeout is None else min(timeout, wait)
+                            continue
+                        for lim in limiters: lim.charge(unit[3])
+                    except Exception:
+                        pass   # malformed unit, the worker fails it
+                    dq.popleft()
+                    if dq: q.move_to_end(client)   # back of the line for this client
+                    else: del q[client]
+                    return job, unit
+                self.cond.wait(timeout)
+
+    def _limiter(self, device):
+        with self.cond:
+            if device not in self.device_limiters:
+                self.device_limiters[device] = RateLimiter(self.device_limit)
+            return self.device_limiters[device]
+
+    def _work(self):
+        while True:
+            job, unit = self._next()
+            # Anything going wrong with a unit fails that unit, never the worker
+            try: ok, error = self._transfer(job, unit)
+            except Exception as e: ok, error = False, str(e)
+            job.finish(unit, ok, error)
+
+    def _transfer(self, job, unit):
+        op, src, dest, nbytes = unit
+        start = time.monotonic()
+        try: ok, error = getattr(self.transport, op)(src, dest)
+        except Exception as e: ok, error = False, str(e)
+        end = time.monotonic()
+        with self.cond:
+            samples = self.meters.setdefault(job.device, deque())
+            samples.append((start, end, nbytes))
+            self._prune(samples)
+        return ok, error
+
+SCHEDULER = TransferScheduler()
+
+def default_device():
+    # Key for the per-device limiter, adb itself targets ANDROID_SERIAL
+    return os.environ.get('ANDROID_SERIAL', 'default')
+
+def local_tree(root):
+    # {relative path: (bytes, mtime)} for every file under a local folder
+    root = to_local_path(root)
+    files = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            full = os.path.join(dirpath, name)
+            try: st = os.stat(full)
+            except OSError: continue
+            files[os.path.relpath(full, root).replace("\\", "/")] = (st.st_size, int(st.st_mtime))
+    return files
+
+def android_tree(root):
+    # Same as local_tree for a device folder, from a single find call
+    root = root.rstrip('/') or '/'
+    prefix = root if root.endswith('/') else root + '/'
+    r = subprocess.run(['adb', 'shell', f"find {shlex.quote(root)} -type f -exec stat -c '%s %Y %n' {{}} + 2>/dev/null"],
+                       capture_output=True, text=True)
+    files = {}
+    for line in r.stdout.splitlines():
+        size, mtime, path = (line.split(' ', 2) + ['', ''])[:3]
+        if size.isdigit() and mtime.isdigit() and path.startswith(prefix):
+            files[path[len(prefix):]] = (int(size), int(mtime))
+    return files
+
+def push_units(items, split=False):
+    # With a bandwidth cap, folders are split into per-file units so pacing stays smooth
+    units = []
+    for i in items:
+        src = to_local_path(i['source'])
+        if split and os.path.isdir(src):
+            units.extend(('push', os.path.join(src, *rel.split('/')), i['dest'].rstrip('/') + '/' + rel, size)
+                         for rel, (size, _) in local_tree(i['source']).items())
+        else:
+            units.append(('push', src, i['dest'], du_local_total([i['source']])))
+    return units
+
+def pull_units(items, split=False):
+    units = []
+    sizes = du_android_sizes([i['source'] for i in items])
+    for i in items:
+        dest = to_local_path(i['dest'])
+        src = i['source'].rstrip('/') or '/'
+        if split and i.get('is_dir'):
+            for rel, (size, _) in android_tree(src).items():
+                units.append(('pull', src.rstrip('/') + '/' + rel, os.path.join(dest, *rel.split('/')), size))
+        else:
+            units.append(('pull', i['source'], dest, sizes.get(i['source'], 0)))
+    return units
+
+# -----------------------
+# ENGINE
+# -----------------------
+def windows_drives():
+    drives = []
+    bitmask = ctypes.windll.kernel32.GetLogicalDrives()
+    for letter in string.ascii_uppercase:
+        if bitmask & 1:
+            drives.append({
+                'name': f"{letter}:",
+                'is_dir': True,
+                'is_drive': True,
+                'size': 0,
+                'modified': '-',
+                'path': f"{letter}:/"
+            })
+        bitmask >>= 1
+    return drives
+
+class TransferEngine:
+    """Listing, transfer, install and status logic shared by the HTTP server,
+    the CLI and any script that imports this module. Methods return plain
+    dicts/lists and raise on listing errors."""
+
+    JOB_OPTIONS = ('verify', 'algo', 'client', 'priority', 'device')
+
+    def __init__(self, scheduler=None):
+        self.scheduler = scheduler or SCHEDULER
+
+    def list_local(self, path):
+        # Windows Root Logic
+        if IS_WINDOWS and path in ('/', ''): return windows_drives()
+        items = []
+        if path != '/': items.append({'name':'..','is_dir':True,'size':0,'modified':'-','path':path})
+        for entry in os.scandir(to_local_path(path)):
+            try: items.append(local_entry(entry.name, entry.path, entry.stat()))
+            except: continue
+        items.sort(key=lambda x: (not x['is_dir'], x['name'].lower()))
+        return items
+
+    def list_android(self, path):
+        if not path.endswith('/'): path += '/'
+        # ADB always uses Linux paths, so no conversion needed here
+        cmd = ['adb', 'shell', 'ls', '-1p', path]
+        with self.scheduler.interactive():
+            r = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
+        if r.returncode != 0: raise Exception(r.stderr)
+
+        items = []
+        if path not in ['/', '/sdcard/']: items.append({'name':'..','is_dir':True,'size':0,'modified':'-','path':path})
+
+        for line in r.stdout.splitlines():
+            name = line.strip()
+            if not name: continue
+            is_dir = name.endswith('/')
+            clean_name = name[:-1] if is_dir else name
+            items.append({
+                'name': clean_name,
+                'is_dir': is_dir,
+                'size': 0,
+                'modified': '-',
+                'path': path + clean_name
+            })
+        return items
+
+    def status(self):
+        try:
+            r = subprocess.run(['adb', 'devices'], capture_output=True, text=True, timeout=2)
+            return {'connected': any(line.endswith('\tdevice') or line.endswith(' device') for line in r.stdout.splitlines())}
+        except:
+            return {'connected': False}
+
+    def push(self, items, **opts):
+        check_algo(opts.get('algo', 'sha256'))
+        return self.run_units('push', push_units(items, self.scheduler.limited), **opts)
+
+    def pull(self, items, **opts):
+        check_algo(opts.get('algo', 'sha256'))
+        return self.run_units('pull', pull_units(items, self.scheduler.limited), **opts)
+
+    def sync(self, source, dest, direction='push', **opts):
+        """One-way folder mirror: only files missing on the other side, with a
+        different size, or older than the source are transferred."""
+        check_algo(opts.get('algo', 'sha256'))
+        if direction == 'push': src_files, dst_files = local_tree(source), android_tree(dest)
+        else: src_files, dst_files = android_tree(source), local_tree(dest)
+        units = []
+        for rel, (size, mtime) in src_files.items():
+            have = dst_files.get(rel)
+            if have and have[0] == size and have[1] >= mtime: continue
+            if direction == 'push':
+                units.append(('push', os.path.join(to_local_path(source), *rel.split('/')), dest.rstrip('/') + '/' + rel, size))
+            else:
+                units.append(('pull', source.rstrip('/') + '/' + rel, os.path.join(to_local_path(dest), *rel.split('/')), size))
+        res = self.run_units(direction, units, **opts)
+        res['skipped'] = len(src_files) - len(units)
+        return res
+
+    def install(self, source):
+        src = to_local_path(source)
+        r = subprocess.run(['adb', 'install', '-r', src], capture_output=True, text=True)
+        if r.returncode == 0: return {'success': True}
+        return {'success': False, 'error': r.stderr}
+
+    def apps(self, refresh=False):
+        apps, cached = INVENTORY.list(refresh)
+        return {'apps': apps, 'cached': cached}
+
+    def backup(self, packages=None, store=None, priority=None):
+        apps = INVENTORY.list()[0]
+        if packages: apps = [a for a in apps if a['package'] in set(packages)]
+        return backup_apks(apps, ApkStore(to_local_path(store) if store else APK_STORE), self.scheduler,
+                           priority or 'background')
+
+    def run_units(self, op, units, verify=False, algo='sha256', client='local', priority='normal', device=None):
+        check_algo(algo)
+        success = True; errors = []; done = []
+        total = sum(u[3] for u in units)
+        start = time.time()
+        results = self.scheduler.run(units, client=client, priority=priority,
+                                     device=device or default_device())
+        for (_, src, dest, _), ok, error in results:
+            if not ok:
+                success = False
+                errors.append(error)
+            else: done.append((src, dest))
+        res = {'transfer': throughput(total, time.time() - start)}
+        if verify:
+            pairs = [p for src, dest in done for p in verify_pairs(op, src, dest)]
+            res['verify'] = verify_transfer(pairs, algo)
+            for m in res['verify']['mismatches']:
+                success = False
+                errors.append(f"Verify failed: {m['local']} <-> {m['device']}")
+        return dict(res, success=success, errors=errors, total_bytes=total)
+
+    def run_job(self, job):
+        # A failing job reports its own error instead of aborting the batch
+        op = job.get('op')
+        try: return self._run_job(op, job)
+        except KeyError as e: return {'success': False, 'errors': [f"{op}: missing field {e}"]}
+        except Exception as e: return {'success': False, 'errors': [f"{op}: {e}"]}
+
+    def _run_job(self, op, job):
+        # Options left out (or null) fall back to each op's own defaults
+        opts = {k: job[k] for k in self.JOB_OPTIONS if job.get(k) is not None}
+        if op in ('push', 'pull'): return getattr(self, op)(job.get('items', []), **opts)
+        if op == 'sync': return self.sync(job['source'], job['dest'], job.get('direction', 'push'), **opts)
+        if op == 'install': return self.install(job['source'])
+        if op == 'backup': return self.backup(job.get('packages'), job.get('store'), job.get('priority'))
+        return {'success': False, 'errors': [f"Unknown op: {op}"]}
+
+    def run_manifest(self, manifest):
+        """Runs the jobs of a batch manifest concurrently (up to
+        MANIFEST_WORKERS at a time), so their units share the scheduler's
+        worker pool exactly like concurrent HTTP clients."""
+        jobs = manifest.get('jobs', []) if isinstance(manifest, dict) else manifest
+        if not jobs: return []
+        with ThreadPoolExecutor(min(len(jobs), MANIFEST_WORKERS)) as pool:
+            return list(pool.map(self.run_job, jobs))
+
+ENGINE = TransferEngine()
+
+# -----------------------
+# APP INVENTORY & BACKUP
+# -----------------------
+APK_STORE = os.path.join(os.path.expanduser('~'), 'apk-backups')
+PM_LIST = 'pm list packages -f --show-versioncode 2>/dev/null'
+# One shell call: every package line, then size/mtime of each APK `pm path` reports for it
+# (base + splits). The install dir can't be globbed: /system/framework and the overlay
+# dirs hold APKs of many packages. pm reads stdin, so it gets /dev/null, not the loop's.
+PM_INVENTORY = (PM_LIST + ' | while IFS= read -r l; do echo "P $l"; '
+                'a="${l#package:}"; a="${a% versionCode:*}"; '
+                'pm path "${a##*=}" </dev/null 2>/dev/null | while IFS= read -r f; do '
+                'stat -c "A %s %Y %n" "${f#package:}" 2>/dev/null; done; done')
+
+class AppInventory:
+    """Installed packages with version codes and APK paths. Cached until the
+    `pm list packages` output changes (install, update or uninstall)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fingerprint = None
+        self.apps = []
+
+    @staticmethod
+    def _parse_package(line):
+        rest = line[len('package:'):]
+        # Older pm versions print no versionCode
+        if ' versionCode:' in rest: rest, _, version = rest.rpartition(' versionCode:')
+        else: version = ''
+        path, _, name = rest.rpartition('=')
+        return {'package': name, 'version_code': int(version) if version.isdigit() else 0, 'base': path, 'apks': []}
+
+    def list(self, refresh=False):
+        r = subprocess.run(['adb', 'shell', PM_LIST], capture_output=True, text=True, timeout=30)
+        fingerprint = hashlib.sha256(r.stdout.encode('utf-8')).hexdigest()
+        with self.lock:
+            if fingerprint == self.fingerprint and not refresh: return self.apps, True
+        r = subprocess.run(['adb', 'shell', PM_INVENTORY], capture_output=True, text=True, timeout=120)
+        apps = []
+        for line in r.stdout.splitlines():
+            if line.startswith('P package:'): apps.append(self._parse_package(line[2:]))
+            elif line.startswith('A ') and apps:
+                size, mtime, path = (line[2:].split(' ', 2) + ['', ''])[:3]
+                if size.isdigit() and mtime.isdigit():
+                    apps[-1]['apks'].append({'path': path, 'size': int(size), 'mtime': int(mtime)})
+        apps.sort(key=lambda a: a['package'])
+        with self.lock:
+            self.fingerprint, self.apps = fingerprint, apps
+        return apps, False
+
+class ApkStore:
+    """Content-addressed APK backups: objects/<sha[:2]>/<sha>.apk plus one
+    manifest per app version. index.json maps a device APK (path, size, mtime)
+    to its digest so unchanged APKs are skipped without re-hashing them."""
+
+    def __init__(self, root=APK_STORE):
+        self.root = root
+        self.index_path = os.path.join(root, 'index.json')
+
+    def object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest + '.apk')
+
+    def load_index(self):
+        try:
+            with open(self.index_path) as f: return json.load(f)
+        except (OSError, ValueError): return {}
+
+    def save_index(self, index):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.index_path + '.tmp'
+        with open(tmp, 'w') as f: json.dump(index, f)
+        os.replace(tmp, self.index_path)
+
+    def write_manifest(self, app, digests):
+        folder = os.path.join(self.root, 'apps', app['package'])
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"{app['version_code']}.json"), 'w') as f:
+            json.dump({'package': app['package'], 'version_code': app['version_code'],
+                       'apks': {os.path.basename(a['path']): digests.get(a['path']) for a in app['apks']}}, f, indent=2)
+
+def backup_apks(apps, store, scheduler, priority='background'):
+    """Pulls the base and split APKs of many apps through the transfer
+    scheduler, skipping any APK whose content is already in the store.
+    pulled/skipped/failed count the listed APKs, so they always add up to
+    `apks`; an APK whose content another entry pulls counts as skipped."""
+    index = store.load_index()
+    apks = [a for app in apps for a in app['apks']]
+    key = lambda a: f"{a['path']}|{a['size']}|{a['mtime']}"
+    digests, errors = {}, []
+
+    # Unknown APKs get hashed on the device first, in batched shell calls
+    unknown = [a for a in apks if key(a) not in index]
+    device_digests = hash_android([a['path'] for a in unknown]) if unknown else {}
+    for a in unknown:
+        if a['path'] in device_digests: index[key(a)] = device_digests[a['path']]
+        else: errors.append(f"Could not hash {a['path']}")
+
+    wanted = {}   # digest -> (device path, bytes) still missing from the store
+    status = []   # per APK: (digest, 'failed' | 'skipped' | 'pull' | 'dup')
+    for a in apks:
+        digest = index.get(key(a))
+        if not digest:
+            status.append((None, 'failed'))
+            continue
+        digests[a['path']] = digest
+        if os.path.exists(store.object_path(digest)): status.append((digest, 'skipped'))
+        elif digest in wanted: status.append((digest, 'dup'))
+        else:
+            wanted[digest] = (a['path'], a['size'])
+            status.append((digest, 'pull'))
+    tmp_dir = os.path.join(store.root, 'tmp')
+    units = [('pull', src, os.path.join(tmp_dir, digest + '.apk'), size) for digest, (src, size) in wanted.items()]
+
+    start = time.time()
+    pulled_bytes, stored, failed = 0, set(), set()
+    results = scheduler.run(units, client='apk-backup', priority=priority, device=default_device())
+    for (_, src, tmp, size), ok, error in results:
+        digest = os.path.basename(tmp)[:-4]
+        try: good = ok and hash_local(tmp, cache=False)[0] == digest
+        except OSError: good = False
+        if good:
+            os.makedirs(os.path.dirname(store.object_path(digest)), exist_ok=True)
+            os.replace(tmp, store.object_path(digest))
+            stored.add(digest)
+            pulled_bytes += size
+        else:
+            failed.add(digest)
+            errors.append(error if not ok else f"Verify failed: {src}")
+            if os.path.exists(tmp): os.remove(tmp)
+
+    # Manifests only point at objects that are really in the store
+    digests = {path: (None if d in failed else d) for path, d in digests.items()}
+    for app in apps: store.write_manifest(app, digests)
+    store.save_index(index)
+    counts = {'pulled': 0, 'skipped': 0, 'failed': 0}
+    for digest, state in status:
+        if state in ('pull', 'dup'): state = ('pulled' if state == 'pull' else 'skipped') if digest in stored else 'failed'
+        counts[state] += 1
+    return {'success': not errors, 'errors': errors, 'apps': len(apps), 'apks': len(apks), **counts,
+            'transfer': throughput(pulled_bytes, time.time() - start), 'store': store.root.replace("\\", "/")}
+
+INVENTORY = AppInventory()
+
 # -----------------------
 # SERVER LOGIC
 # -----------------------
@@ -599,8 +1685,18 @@ class ADBFileServer(SimpleHTTPRequestHandler):
             self.list_linux_files(parse_qs(parsed.query))
         elif parsed.path == '/api/android/list':
             self.list_android_files(parse_qs(parsed.query))
+        elif parsed.path == '/api/linux/watch':
+            self.watch_linux(parse_qs(parsed.query))
+        elif parsed.path == '/api/linux/du':
+            self.du_linux(parse_qs(parsed.query))
+        elif parsed.path == '/api/android/du':
+            self.du_android(parse_qs(parsed.query))
+        elif parsed.path == '/api/android/apps':
+            self.list_apps(parse_qs(parsed.query))
         elif parsed.path == '/api/status':
             self.check_adb_status()
+        elif parsed.path == '/api/scheduler':
+            self.scheduler_status()
         else:
             self.send_error(404)
 
@@ -619,6 +1715,12 @@ class ADBFileServer(SimpleHTTPRequestHandler):
             self.pull_items(data)
         elif parsed.path == '/api/install':
             self.install_apk(data)
+        elif parsed.path == '/api/preflight':
+            self.preflight(data)
+        elif parsed.path == '/api/android/apps/backup':
+            self.backup_apps(data)
+        elif parsed.path == '/api/scheduler':
+            self.scheduler_config(data)
         else:
             self.send_error(404)
 
@@ -636,131 +1738,139 @@ class ADBFileServer(SimpleHTTPRequestHandler):
         except Exception as e:
             self.send_error(500, str(e))
 
-    def get_windows_drives(self):
-        drives = []
-        bitmask = ctypes.windll.kernel32.GetLogicalDrives()
-        for letter in string.ascii_uppercase:
-            if bitmask & 1:
-                drives.append({
-                    'name': f"{letter}:",
-                    'is_dir': True,
-                    'is_drive': True,
-                    'size': 0,
-                    'modified': '-',
-                    'path': f"{letter}:/"
-                })
-            bitmask >>= 1
-        return drives
-
     def list_linux_files(self, params):
         path = params.get('path', [os.path.expanduser('~')])[0]
-        
-        # Windows Root Logic
-        if IS_WINDOWS:
-            if path == '/' or path == '':
-                self.send_json({'files': self.get_windows_drives()})
-                return
-            # Convert / to \ for os module, but keep drive letters clean
-            local_path = path.replace('/', '\\')
-            if len(local_path) == 2 and local_path[1] == ':': local_path += '\\'
-        else:
-            local_path = path
+        try: self.send_json({'files': ENGINE.list_local(path)})
+        except Exception as e: self.send_json({'files': [], 'error': str(e)}, 500)
 
+    def watch_linux(self, params):
+        path = params.get('path', [os.path.expanduser('~')])[0]
+        if IS_WINDOWS and path in ('/', ''):
+            self.send_error(404)
+            return
+        local_path = os.path.normpath(to_local_path(path))
+        if not os.path.isdir(local_path):
+            self.send_error(404)
+            return
+        q = WATCHER.subscribe(local_path)
         try:
-            items = []
-            if IS_WINDOWS:
-                if path != '/': items.append({'name':'..','is_dir':True,'size':0,'modified':'-','path':path})
-            else:
-                if path != '/': items.append({'name':'..','is_dir':True,'size':0,'modified':'-','path':path})
-            
-            for entry in os.scandir(local_path):
-                try:
-                    stats = entry.stat()
-                    items.append({
-                        'name': entry.name,
-                        'is_dir': entry.is_dir(),
-                        'is_drive': False,
-                        'size': stats.st_size,
-                        'modified': time.strftime('%Y-%m-%d %H:%M', time.localtime(stats.st_mtime)),
-                        'path': entry.path.replace("\\", "/") # Normalize back to / for frontend
-                    })
-                except: continue
-            
-            items.sort(key=lambda x: (not x['is_dir'], x['name'].lower()))
-            self.send_json({'files': items})
-        except Exception as e:
-            self.send_json({'files': [], 'error': str(e)}, 500)
+            self.start_sse()
+            while True:
+                try: changes = [q.get(timeout=WATCH_KEEPALIVE_SECONDS)]
+                except queue.Empty:
+                    # Comment line, lets us notice a client that went away
+                    self.wfile.write(b': ping\n\n')
+                    self.wfile.flush()
+                    continue
+                # Coalesce bursts (e.g. a file growing during a copy) into one event
+                time.sleep(WATCH_BATCH_SECONDS)
+                while not q.empty(): changes.append(q.get_nowait())
+                gone = any(c['op'] == 'gone' for c in changes)
+                changes = [c for c in changes if c['op'] != 'gone']
+                latest = {}
+                for c in changes:
+                    key = c['file']['path'] if 'file' in c else c['path']
+                    if c['op'] == 'modify' and latest.get(key, {}).get('op') == 'add': c = dict(c, op='add')
+                    latest[key] = c
+                if latest: self.send_event({'changes': list(latest.values())})
+                if gone:
+                    self.send_event({'path': path}, event='gone')
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            WATCHER.unsubscribe(q)
 
     def list_android_files(self, params):
         path = params.get('path', ['/sdcard/'])[0]
-        if not path.endswith('/'): path += '/'
+        try: self.send_json({'files': ENGINE.list_android(path)})
+        except Exception as e: self.send_json({'files': [], 'error': str(e)}, 500)
+
+    def du_linux(self, params):
+        path = params.get('path', [os.path.expanduser('~')])[0]
+        if IS_WINDOWS and path in ('/', ''):
+            self.send_json({'path': path, 'total': 0, 'children': {}})
+            return
+        refresh = params.get('refresh', ['0'])[0] == '1'
+        self.run_du(path, lambda cb: du_local(to_local_path(path), cb, refresh), params)
+
+    def du_android(self, params):
+        path = params.get('path', ['/sdcard/'])[0]
+        self.run_du(path, lambda cb: du_android(path, cb), params)
+
+    def run_du(self, path, walk, params):
+        # ?stream=1 sends each child as an SSE event while the walk runs
+        streaming = params.get('stream', ['0'])[0] == '1'
         try:
-            # ADB always uses Linux paths, so no conversion needed here
-            cmd = ['adb', 'shell', 'ls', '-1p', path]
-            r = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-            if r.returncode != 0: raise Exception(r.stderr)
-            
-            items = []
-            if path not in ['/', '/sdcard/']: items.append({'name':'..','is_dir':True,'size':0,'modified':'-','path':path})
-            
-            for line in r.stdout.splitlines():
-                name = line.strip()
-                if not name: continue
-                is_dir = name.endswith('/')
-                clean_name = name[:-1] if is_dir else name
-                items.append({
-                    'name': clean_name,
-                    'is_dir': is_dir,
-                    'size': 0, 
-                    'modified': '-',
-                    'path': path + clean_name
-                })
-            
-            self.send_json({'files': items})
+            if not streaming:
+                total, children = walk(None)
+                self.send_json({'path': path, 'total': total, 'children': children})
+                return
+            self.start_sse()
+            total, _ = walk(lambda name, size: self.send_event({'path': name, 'size': size}))
+            self.send_event({'path': path, 'total': total}, 'done')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
         except Exception as e:
-            self.send_json({'files': [], 'error': str(e)}, 500)
+            # Headers are already out once the stream started
+            if streaming: self.send_event({'path': path, 'error': str(e)}, 'error')
+            else: self.send_json({'path': path, 'total': 0, 'children': {}, 'error': str(e)}, 500)
 
-    def check_adb_status(self):
+    def preflight(self, data):
+        # Byte total for a push/pull batch, computed before anything moves
+        sources = [i['source'] for i in data.get('items', [])]
         try:
-            r = subprocess.run(['adb', 'devices'], capture_output=True, text=True, timeout=2)
-            connected = any(line.endswith('\tdevice') or line.endswith(' device') for line in r.stdout.splitlines())
-            self.send_json({'connected': connected})
-        except:
-            self.send_json({'connected': False})
+            if data.get('direction') == 'pull': total = du_android_total(sources)
+            else: total = du_local_total(sources)
+            self.send_json({'total_bytes': total})
+        except Exception as e:
+            self.send_json({'total_bytes': 0, 'error': str(e)}, 500)
+
+    def check_adb_status(self):
+        self.send_json(ENGINE.status())
 
     def push_items(self, data):
-        items = data.get('items', [])
-        success = True; errors = []
-        for i in items:
-            # Convert source (Local) to system path
-            src = i['source'].replace('/', '\\') if IS_WINDOWS else i['source']
-            cmd = ['adb', 'push', src, i['dest']]
-            r = subprocess.run(cmd, capture_output=True, text=True)
-            if r.returncode != 0:
-                success = False
-                errors.append(r.stderr)
-        self.send_json({'success': success, 'errors': errors})
+        self.transfer_items(ENGINE.push, data)
 
     def pull_items(self, data):
-        items = data.get('items', [])
-        success = True; errors = []
-        for i in items:
-            # Convert dest (Local) to system path
-            dest = i['dest'].replace('/', '\\') if IS_WINDOWS else i['dest']
-            cmd = ['adb', 'pull', i['source'], dest]
-            r = subprocess.run(cmd, capture_output=True, text=True)
-            if r.returncode != 0:
-                success = False
-                errors.append(r.stderr)
-        self.send_json({'success': success, 'errors': errors})
+        self.transfer_items(ENGINE.pull, data)
+
+    def transfer_items(self, transfer, data):
+        # Bad requests (unknown algo, items without source/dest) get a 400, anything else a 500
+        try: res = transfer(data.get('items', []), **self.job_options(data))
+        except KeyError as e:
+            self.send_json({'success': False, 'errors': [f"Missing field {e} in items"]}, 400)
+        except (ValueError, TypeError) as e:
+            self.send_json({'success': False, 'errors': [str(e)]}, 400)
+        except Exception as e:
+            self.send_json({'success': False, 'errors': [str(e)]}, 500)
+        else: self.send_json(res)
+
+    def job_options(self, data):
+        opts = {k: data[k] for k in TransferEngine.JOB_OPTIONS if data.get(k)}
+        opts.setdefault('client', self.client_address[0])
+        return opts
+
+    def scheduler_status(self):
+        self.send_json(SCHEDULER.stats())
+
+    def scheduler_config(self, data):
+        try: SCHEDULER.set_limits(data.get('global_limit'), data.get('device_limit'))
+        except ValueError as e:
+            self.send_json({'error': str(e)}, 400)
+            return
+        self.send_json(SCHEDULER.stats())
 
     def install_apk(self, data):
-        src = data.get('source')
-        if IS_WINDOWS: src = src.replace('/', '\\')
-        cmd = ['adb', 'install', '-r', src]
-        r = subprocess.run(cmd, capture_output=True, text=True)
-        if r.returncode == 0: self.send_json({'success': True})
-        else: self.send_json({'success': False, 'error': r.stderr})
+        self.send_json(ENGINE.install(data.get('source')))
+
+    def list_apps(self, params):
+        try: self.send_json(ENGINE.apps(params.get('refresh', ['0'])[0] == '1'))
+        except Exception as e: self.send_json({'apps': [], 'error': str(e)}, 500)
+
+    def backup_apps(self, data):
+        try: self.send_json(ENGINE.backup(data.get('packages'), data.get('store'), data.get('priority')))
+        except Exception as e: self.send_json({'success': False, 'errors': [str(e)]}, 500)
 
     def send_json(self, data, status=200):
         self.send_response(status)
@@ -768,14 +1878,137 @@ class ADBFileServer(SimpleHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(json.dumps(data).encode('utf-8'))
 
-def main():
-    print(f"Starting ADB Manager on http://localhost:{PORT}")
+    def start_sse(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+    def send_event(self, data, event=None):
+        msg = (f"event: {event}\n" if event else "") + f"data: {json.dumps(data)}\n\n"
+        self.wfile.write(msg.encode('utf-8'))
+        self.wfile.flush()
+
+# -----------------------
+# COMMAND LINE
+# -----------------------
+def serve(port=PORT):
+    print(f"Starting ADB Manager on http://localhost:{port}")
     print(f"Platform: {platform.system()}")
     try:
-        httpd = HTTPServer(('0.0.0.0', PORT), ADBFileServer)
+        httpd = ThreadingHTTPServer(('0.0.0.0', port), ADBFileServer)
         httpd.serve_forever()
     except KeyboardInterrupt:
         print("\nStopping...")
 
+def cli_items(sources, dest, android_dest):
+    # Same layout as the UI: each source lands inside dest under its own name
+    items = []
+    for src in sources:
+        name = os.path.basename(src.rstrip('/\\')) or src
+        target = dest.rstrip('/') + '/' + name if android_dest else os.path.join(dest, name)
+        items.append({'source': src, 'dest': target, 'is_dir': os.path.isdir(src) if android_dest else None, 'name': name})
+    return items
+
+def print_result(res, as_json):
+    if as_json:
+        print(json.dumps(res, indent=2))
+        return
+    for r in (res if isinstance(res, list) else [res]):
+        if 'transfer' in r:
+            t = r['transfer']
+            print(f"{'OK' if r['success'] else 'FAILED'}: {t['bytes']} bytes in {t['seconds']}s ({t['mb_per_s']} MB/s)"
+                  + (f", {r['skipped']} unchanged" if 'skipped' in r else ''))
+        else:
+            print('OK' if r.get('success') else 'FAILED')
+        if 'verify' in r:
+            v = r['verify']
+            print(f"Verify: {v['files']} files, {v['mb_per_s']} MB/s, {len(v['mismatches'])} mismatches")
+        for e in r.get('errors', []) + ([r['error']] if r.get('error') else []):
+            print('  ' + e.strip(), file=sys.stderr)
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--json', action='store_true', help='machine-readable output')
+    jobs = argparse.ArgumentParser(add_help=False)
+    jobs.add_argument('--verify', action='store_true', help='hash both sides after transfer')
+    jobs.add_argument('--priority', choices=list(PRIORITIES), help='default: normal, background for backup')
+    jobs.add_argument('--bwlimit', type=int, default=0, help='global cap in bytes/s')
+
+    parser = argparse.ArgumentParser(prog='adb-fm', description='ADB File Manager (no command starts the web UI)')
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('serve', help='start the web UI')
+    p.add_argument('--port', type=int, default=PORT)
+    p = sub.add_parser('ls', parents=[common], help='list a folder')
+    p.add_argument('path')
+    p.add_argument('--android', action='store_true', help='list on the device')
+    p = sub.add_parser('push', parents=[common, jobs], help='copy host files to the device')
+    p.add_argument('sources', nargs='+')
+    p.add_argument('dest')
+    p = sub.add_parser('pull', parents=[common, jobs], help='copy device files to the host')
+    p.add_argument('sources', nargs='+')
+    p.add_argument('dest')
+    p = sub.add_parser('sync', parents=[common, jobs], help='mirror a folder, skipping unchanged files')
+    p.add_argument('source')
+    p.add_argument('dest')
+    p.add_argument('--direction', choices=['push', 'pull'], default='push')
+    p = sub.add_parser('install', parents=[common], help='install an APK')
+    p.add_argument('apk')
+    sub.add_parser('status', parents=[common], help='check the adb connection')
+    p = sub.add_parser('apps', parents=[common], help='list installed packages and their APKs')
+    p.add_argument('--refresh', action='store_true')
+    p = sub.add_parser('backup', parents=[common, jobs], help='back up installed APKs into a content-addressed store')
+    p.add_argument('packages', nargs='*', help='default: every package')
+    p.add_argument('--store', default=APK_STORE)
+    p = sub.add_parser('batch', parents=[common, jobs], help='run a JSON manifest of jobs in-process')
+    p.add_argument('manifest', help="manifest file, or - for stdin")
+    args = parser.parse_args(argv)
+
+    if args.command in (None, 'serve'):
+        serve(getattr(args, 'port', PORT))
+        return 0
+    if getattr(args, 'bwlimit', 0): SCHEDULER.set_limits(global_limit=args.bwlimit)
+    opts = {}
+    if hasattr(args, 'verify'):
+        opts = {'verify': args.verify, 'client': 'cli'}
+        if args.priority: opts['priority'] = args.priority
+
+    try:
+        if args.command == 'ls':
+            files = ENGINE.list_android(args.path) if args.android else ENGINE.list_local(args.path)
+            if args.json: print(json.dumps(files, indent=2))
+            else:
+                for f in files: print(f"{'d' if f['is_dir'] else '-'} {f['size']:>12} {f['modified']:>16}  {f['name']}")
+            return 0
+        if args.command == 'status':
+            res = ENGINE.status()
+            print(json.dumps(res) if args.json else ('connected' if res['connected'] else 'no devices'))
+            return 0 if res['connected'] else 1
+        if args.command == 'apps':
+            res = ENGINE.apps(args.refresh)
+            if args.json: print(json.dumps(res, indent=2))
+            else:
+                for a in res['apps']: print(f"{a['package']:<50} {a['version_code']:>12}  {len(a['apks'])} apk")
+            return 0
+        if args.command == 'backup':
+            res = ENGINE.backup(args.packages, args.store, args.priority)
+            if not args.json:
+                print(f"{res['apps']} apps, {res['apks']} APKs: {res['pulled']} pulled, {res['skipped']} already stored, "
+                      f"{res['failed']} failed -> {res['store']}")
+        elif args.command == 'push': res = ENGINE.push(cli_items(args.sources, args.dest, True), **opts)
+        elif args.command == 'pull': res = ENGINE.pull(cli_items(args.sources, args.dest, False), **opts)
+        elif args.command == 'sync': res = ENGINE.sync(args.source, args.dest, args.direction, **opts)
+        elif args.command == 'install': res = ENGINE.install(args.apk)
+        else:
+            with (sys.stdin if args.manifest == '-' else open(args.manifest)) as f: manifest = json.load(f)
+            jobs_list = manifest.get('jobs', []) if isinstance(manifest, dict) else manifest
+            res = ENGINE.run_manifest([dict(opts, **j) for j in jobs_list])
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}) if args.json else f"Error: {e}", file=sys.stderr)
+        return 1
+    print_result(res, args.json)
+    ok = all(r.get('success') for r in res) if isinstance(res, list) else res.get('success')
+    return 0 if ok else 1
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
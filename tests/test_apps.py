@@ -0,0 +1,138 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import adb_file_manager as fm
+
+
+def shell_output(stdout):
+    return subprocess.CompletedProcess([], 0, stdout=stdout, stderr='')
+
+
+PM_LIST_OUTPUT = ('package:/data/app/~~Qx9a==/com.example.app-Zk3b==/base.apk=com.example.app versionCode:42\n'
+                  'package:/system/framework/framework-res.apk=android versionCode:34\n')
+
+PM_INVENTORY_OUTPUT = (
+    'P package:/data/app/~~Qx9a==/com.example.app-Zk3b==/base.apk=com.example.app versionCode:42\n'
+    'A 1000 1700000000 /data/app/~~Qx9a==/com.example.app-Zk3b==/base.apk\n'
+    'A 200 1700000001 /data/app/~~Qx9a==/com.example.app-Zk3b==/split_config.en.apk\n'
+    'P package:/system/framework/framework-res.apk=android versionCode:34\n'
+    'A 5000 1600000000 /system/framework/framework-res.apk\n'
+    'A bogus line\n')
+
+
+class InventoryTests(unittest.TestCase):
+    def test_parse_package_with_equals_in_path(self):
+        app = fm.AppInventory._parse_package(PM_LIST_OUTPUT.splitlines()[0])
+        self.assertEqual(app, {'package': 'com.example.app', 'version_code': 42, 'apks': [],
+                               'base': '/data/app/~~Qx9a==/com.example.app-Zk3b==/base.apk'})
+
+    def test_parse_package_without_version(self):
+        app = fm.AppInventory._parse_package('package:/data/app/a==/base.apk=com.a')
+        self.assertEqual((app['package'], app['version_code'], app['base']), ('com.a', 0, '/data/app/a==/base.apk'))
+
+    def test_list_parses_inventory_and_caches_it(self):
+        inv = fm.AppInventory()
+        outputs = [shell_output(PM_LIST_OUTPUT), shell_output(PM_INVENTORY_OUTPUT), shell_output(PM_LIST_OUTPUT)]
+        with mock.patch.object(fm.subprocess, 'run', side_effect=outputs) as run:
+            apps, cached = inv.list()
+            self.assertFalse(cached)
+            self.assertEqual([a['package'] for a in apps], ['android', 'com.example.app'])
+            self.assertEqual(apps[1]['apks'], [
+                {'path': '/data/app/~~Qx9a==/com.example.app-Zk3b==/base.apk', 'size': 1000, 'mtime': 1700000000},
+                {'path': '/data/app/~~Qx9a==/com.example.app-Zk3b==/split_config.en.apk', 'size': 200,
+                 'mtime': 1700000001}])
+            self.assertEqual(len(apps[0]['apks']), 1)
+            # Same `pm list` output, so the inventory is not walked again
+            self.assertEqual(inv.list(), (apps, True))
+        self.assertEqual(run.call_count, 3)
+
+
+class CopyTransport:
+    """Pulls by copying local files that stand in for device paths."""
+
+    def __init__(self):
+        self.pulled = []
+
+    def pull(self, src, dest):
+        self.pulled.append(src)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copyfile(src, dest)
+        return True, ''
+
+
+class BackupTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.device = os.path.join(self.root, 'device')
+        os.makedirs(self.device)
+        self.store = fm.ApkStore(os.path.join(self.root, 'store'))
+        self.transport = CopyTransport()
+        self.scheduler = fm.TransferScheduler(self.transport, workers=1)
+        a, b, split = self.apk('a.apk', b'AAA'), self.apk('b.apk', b'BBBB'), self.apk('split.apk', b'AAA')
+        # com.c lists the very same APK as com.a, com.b's split has com.a's content
+        self.apps = [{'package': 'com.a', 'version_code': 1, 'apks': [a]},
+                     {'package': 'com.b', 'version_code': 2, 'apks': [b, split]},
+                     {'package': 'com.c', 'version_code': 3, 'apks': [dict(a)]}]
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def apk(self, name, data):
+        path = os.path.join(self.device, name)
+        with open(path, 'wb') as f: f.write(data)
+        return {'path': path, 'size': len(data), 'mtime': 1}
+
+    def backup(self, device_digests=None):
+        def hash_android(paths, algo='sha256'):
+            if device_digests is not None: return {p: device_digests[p] for p in paths if p in device_digests}
+            return {p: hashlib.sha256(open(p, 'rb').read()).hexdigest() for p in paths}
+        with mock.patch.object(fm, 'hash_android', side_effect=hash_android):
+            return fm.backup_apks(self.apps, self.store, self.scheduler)
+
+    def counts(self, res):
+        return res['pulled'], res['skipped'], res['failed']
+
+    def test_dedup_then_skip_on_second_run(self):
+        res = self.backup()
+        self.assertTrue(res['success'], res['errors'])
+        self.assertEqual(res['apks'], 4)
+        self.assertEqual(self.counts(res), (2, 2, 0))
+        self.assertEqual(sorted(os.path.basename(p) for p in self.transport.pulled), ['a.apk', 'b.apk'])
+        self.assertTrue(os.path.exists(self.store.object_path(hashlib.sha256(b'AAA').hexdigest())))
+        self.assertEqual(os.listdir(os.path.join(self.store.root, 'tmp')), [])
+
+        res = self.backup()
+        self.assertTrue(res['success'])
+        self.assertEqual(self.counts(res), (0, 4, 0))
+        self.assertEqual(len(self.transport.pulled), 2)
+
+    def test_verify_failure_fails_every_apk_sharing_the_object(self):
+        a, b = self.apps[0]['apks'][0]['path'], self.apps[1]['apks'][0]['path']
+        split = self.apps[1]['apks'][1]['path']
+        wrong = hashlib.sha256(b'not AAA').hexdigest()
+        res = self.backup({a: wrong, split: wrong, b: hashlib.sha256(b'BBBB').hexdigest()})
+        self.assertFalse(res['success'])
+        self.assertEqual(self.counts(res), (1, 0, 3))
+        self.assertEqual(res['errors'], [f"Verify failed: {a}"])
+        self.assertFalse(os.path.exists(self.store.object_path(wrong)))
+        self.assertEqual(os.listdir(os.path.join(self.store.root, 'tmp')), [])
+        with open(os.path.join(self.store.root, 'apps', 'com.a', '1.json')) as f:
+            self.assertEqual(fm.json.load(f)['apks'], {'a.apk': None})
+
+    def test_unhashable_apk_counts_as_failed(self):
+        b = self.apps[1]['apks'][0]['path']
+        res = self.backup({b: hashlib.sha256(b'BBBB').hexdigest()})
+        self.assertFalse(res['success'])
+        self.assertEqual(self.counts(res), (1, 0, 3))
+        self.assertEqual(len(res['errors']), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import adb_file_manager as fm
+
+
+class RecordingTransport:
+    """Stands in for adb and remembers every (op, src, dest) it was given."""
+
+    def __init__(self):
+        self.moved = []
+        self.lock = threading.Lock()
+
+    def _move(self, op, src, dest):
+        with self.lock: self.moved.append((op, src, dest))
+        return True, ''
+
+    def push(self, src, dest): return self._move('push', src, dest)
+    def pull(self, src, dest): return self._move('pull', src, dest)
+
+
+class SyncTests(unittest.TestCase):
+    def setUp(self):
+        self.transport = RecordingTransport()
+        self.engine = fm.TransferEngine(fm.TransferScheduler(self.transport, workers=1))
+
+    def sync(self, local, android, direction):
+        with mock.patch.object(fm, 'local_tree', return_value=local), \
+             mock.patch.object(fm, 'android_tree', return_value=android):
+            if direction == 'push': return self.engine.sync('/home/u/src', '/sdcard/dst/', 'push')
+            return self.engine.sync('/sdcard/src', '/home/u/dst', 'pull')
+
+    def test_push_sends_missing_changed_and_newer_files(self):
+        local = {'same': (5, 100), 'resized': (6, 100), 'newer': (5, 200), 'new/file': (1, 100)}
+        android = {'same': (5, 100), 'resized': (5, 100), 'newer': (5, 150), 'only-on-device': (1, 1)}
+        res = self.sync(local, android, 'push')
+        self.assertTrue(res['success'])
+        self.assertEqual(res['skipped'], 1)
+        self.assertEqual(res['total_bytes'], 12)
+        self.assertEqual(sorted(dest for _, _, dest in self.transport.moved),
+                         ['/sdcard/dst/new/file', '/sdcard/dst/newer', '/sdcard/dst/resized'])
+
+    def test_pull_skips_up_to_date_local_copies(self):
+        android = {'a': (3, 100), 'b': (3, 100)}
+        local = {'a': (3, 300), 'b': (3, 50)}
+        res = self.sync(local, android, 'pull')
+        self.assertEqual(res['skipped'], 1)
+        self.assertEqual(self.transport.moved, [('pull', '/sdcard/src/b', os.path.join('/home/u/dst', 'b'))])
+
+
+class RunJobTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.file = os.path.join(self.root, 'f.txt')
+        with open(self.file, 'w') as f: f.write('hello')
+        self.transport = RecordingTransport()
+        self.engine = fm.TransferEngine(fm.TransferScheduler(self.transport, workers=1))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_failing_jobs_do_not_abort_the_batch(self):
+        results = self.engine.run_manifest({'jobs': [
+            {'op': 'sync', 'source': self.root},
+            {'op': 'push', 'items': [{'source': self.file, 'dest': '/sdcard/f.txt'}], 'algo': 'crc32'},
+            {'op': 'rename'},
+            {'op': 'push', 'items': [{'source': self.file, 'dest': '/sdcard/f.txt'}]},
+        ]})
+        self.assertEqual([r['success'] for r in results], [False, False, False, True])
+        self.assertEqual(results[0]['errors'], ["sync: missing field 'dest'"])
+        self.assertIn('crc32', results[1]['errors'][0])
+        self.assertEqual(results[2]['errors'], ['Unknown op: rename'])
+        self.assertEqual(results[3]['total_bytes'], 5)
+        self.assertEqual(self.transport.moved, [('push', self.file, '/sdcard/f.txt')])
+
+    def test_manifest_pool_is_capped(self):
+        with mock.patch.object(fm, 'ThreadPoolExecutor', wraps=fm.ThreadPoolExecutor) as pool:
+            self.engine.run_manifest([{'op': 'rename'}] * (fm.MANIFEST_WORKERS * 3))
+        pool.assert_called_once_with(fm.MANIFEST_WORKERS)
+
+
+class TransferEndpointTests(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), fm.ADBFileServer)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.engine = fm.TransferEngine(fm.TransferScheduler(RecordingTransport(), workers=1))
+        self.patch = mock.patch.object(fm, 'ENGINE', self.engine)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post(self, path, data):
+        url = f'http://127.0.0.1:{self.server.server_address[1]}{path}'
+        req = urllib.request.Request(url, data=json.dumps(data).encode(), method='POST')
+        try:
+            with urllib.request.urlopen(req) as r: return r.status, json.load(r)
+        except urllib.error.HTTPError as e:
+            return e.code, json.load(e)
+
+    def test_missing_source_is_a_bad_request(self):
+        status, res = self.post('/api/push', {'items': [{'dest': '/sdcard/'}]})
+        self.assertEqual(status, 400)
+        self.assertFalse(res['success'])
+        self.assertIn('source', res['errors'][0])
+
+    def test_unknown_algo_is_a_bad_request(self):
+        status, res = self.post('/api/pull', {'items': [], 'verify': True, 'algo': 'crc32'})
+        self.assertEqual(status, 400)
+
+    def test_unexpected_failure_is_reported(self):
+        with mock.patch.object(self.engine, 'pull', side_effect=RuntimeError('adb went away')):
+            status, res = self.post('/api/pull', {'items': [{'source': '/sdcard/a', 'dest': '/tmp/a'}]})
+        self.assertEqual((status, res['errors']), (500, ['adb went away']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from collections import deque
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import adb_file_manager as fm
+
+
+class ThrottledTransport:
+    """Stands in for adb: every unit takes nbytes / link_rate seconds and the
+    order units start in is recorded."""
+
+    def __init__(self, link_rate=50_000_000):
+        self.link_rate = link_rate
+        self.sizes = {}
+        self.started = []
+        self.lock = threading.Lock()
+
+    def unit(self, op, name, nbytes):
+        self.sizes[name] = nbytes
+        return (op, name, '/dest/' + name, nbytes)
+
+    def _move(self, src, dest):
+        with self.lock: self.started.append((src, time.monotonic()))
+        if src.startswith('boom'): raise RuntimeError('transport failure')
+        time.sleep(self.sizes[src] / self.link_rate)
+        return True, ''
+
+    push = pull = _move
+
+
+class SchedulerTests(unittest.TestCase):
+    def test_global_cap_is_respected(self):
+        t = ThrottledTransport()
+        s = fm.TransferScheduler(t, workers=2, global_limit=1_000_000)
+        units = [t.unit('push', f'f{i}', 50_000) for i in range(20)]
+        start = time.monotonic()
+        results = s.run(units, client='a')
+        achieved = 1_000_000 / (time.monotonic() - start)
+        self.assertTrue(all(ok for _, ok, _ in results))
+        # One unit may go out before pacing starts, hence the loose upper bound
+        self.assertGreater(achieved, 0.8 * 1_000_000)
+        self.assertLess(achieved, 1.15 * 1_000_000)
+
+    def test_device_cap_is_respected(self):
+        t = ThrottledTransport()
+        s = fm.TransferScheduler(t, workers=2, device_limit=500_000)
+        units = [t.unit('pull', f'd{i}', 25_000) for i in range(20)]
+        s.run(units, client='a', device='dev1')
+        achieved = s.stats()['devices']['dev1']['bytes'] / s.stats()['devices']['dev1']['seconds']
+        self.assertGreater(achieved, 0.8 * 500_000)
+        self.assertLess(achieved, 1.15 * 500_000)
+
+    def test_priority_order_and_round_robin(self):
+        t = ThrottledTransport()
+        s = fm.TransferScheduler(t, workers=1)
+        with s.interactive():
+            jobs = [s.submit([t.unit('push', f'bg{i}', 10) for i in range(2)], client='a', priority='background'),
+                    s.submit([t.unit('push', f'a{i}', 10) for i in range(2)], client='a'),
+                    s.submit([t.unit('push', f'b{i}', 10) for i in range(2)], client='b'),
+                    s.submit([t.unit('push', 'int', 10)], client='c', priority='interactive')]
+            time.sleep(0.1)
+            self.assertEqual(t.started, [])
+        for j in jobs: j.done.wait(5)
+        self.assertEqual([name for name, _ in t.started], ['int', 'a0', 'b0', 'a1', 'b1', 'bg0', 'bg1'])
+
+    def test_interactive_skips_bulk_reservations(self):
+        t = ThrottledTransport()
+        s = fm.TransferScheduler(t, workers=2, global_limit=1000)
+        bulk = s.submit([t.unit('push', f'bulk{i}', 3000) for i in range(3)], client='a', priority='background')
+        time.sleep(0.2)
+        start = time.monotonic()
+        s.run([t.unit('pull', 'small', 10)], client='b', priority='interactive')
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertFalse(bulk.done.is_set())
+
+    def test_large_interactive_unit_is_paced(self):
+        t = ThrottledTransport()
+        s = fm.TransferScheduler(t, workers=2, global_limit=1000)
+        bulk = s.submit([t.unit('push', 'bulk0', 1000)], client='a', priority='background')
+        bulk.done.wait(5)
+        with mock.patch.object(fm, 'INTERACTIVE_MAX_BYTES', 100):
+            start = time.monotonic()
+            s.run([t.unit('pull', 'big', 500)], client='b', priority='interactive')
+        # bulk0 reserved the first second of the cap
+        self.assertGreater(time.monotonic() - start, 0.7)
+
+    def test_device_rate_ignores_old_transfers(self):
+        t = ThrottledTransport()
+        s = fm.TransferScheduler(t, workers=1)
+        now = time.monotonic()
+        s.meters['dev1'] = deque([(now - 3600, now - 3599, 10 ** 9)])
+        s.run([t.unit('pull', 'recent', 50_000)], client='a', device='dev1')
+        self.assertEqual(s.stats()['devices']['dev1']['bytes'], 50_000)
+        self.assertLess(s.stats()['devices']['dev1']['seconds'], 1.0)
+
+    def test_bad_unit_does_not_kill_worker(self):
+        t = ThrottledTransport()
+        s = fm.TransferScheduler(t, workers=1)
+        results = s.run([t.unit('push', 'boom', 10), ('push', 'bad', '/dest/bad', 'not a size')], client='a')
+        self.assertEqual([ok for _, ok, _ in results], [False, False])
+        self.assertTrue(s.run([t.unit('push', 'ok', 10)], client='a')[0][1])
+
+    def test_empty_job_completes(self):
+        t = ThrottledTransport()
+        s = fm.TransferScheduler(t, workers=1)
+        self.assertEqual(s.run([], client='a'), [])
+        self.assertTrue(s.run([t.unit('push', 'after', 10)], client='a')[0][1])
+
+    def test_invalid_limits_are_rejected(self):
+        s = fm.TransferScheduler(ThrottledTransport(), workers=1)
+        for bad in ('fast', -1, [1]):
+            with self.assertRaises(ValueError): s.set_limits(global_limit=bad)
+        s.set_limits(global_limit='1000', device_limit=0)
+        self.assertEqual(s.stats()['global_limit'], 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import adb_file_manager as fm
+
+
+def shell_output(stdout):
+    return subprocess.CompletedProcess([], 0, stdout=stdout, stderr='')
+
+
+class HashAndroidTests(unittest.TestCase):
+    def test_parses_sum_output(self):
+        out = ('ABC123  /sdcard/a file.txt\n'
+               'def456  /sdcard/dir/b\n'
+               'sha256sum: /sdcard/missing: No such file or directory\n')
+        with mock.patch.object(fm.subprocess, 'run', return_value=shell_output(out)) as run:
+            digests = fm.hash_android(['/sdcard/a file.txt', '/sdcard/dir/b', '/sdcard/missing'])
+        self.assertEqual(digests, {'/sdcard/a file.txt': 'abc123', '/sdcard/dir/b': 'def456'})
+        self.assertIn("sha256sum '/sdcard/a file.txt' /sdcard/dir/b /sdcard/missing", run.call_args[0][0][2])
+
+    def test_batches_shell_calls(self):
+        with mock.patch.object(fm, 'VERIFY_BATCH', 2), \
+             mock.patch.object(fm.subprocess, 'run', return_value=shell_output('')) as run:
+            fm.hash_android([f'/sdcard/{i}' for i in range(5)], 'md5')
+        self.assertEqual(run.call_count, 3)
+        self.assertTrue(run.call_args[0][0][2].startswith('md5sum /sdcard/4'))
+
+    def test_rejects_unknown_algorithm(self):
+        with mock.patch.object(fm.subprocess, 'run') as run:
+            with self.assertRaises(ValueError): fm.hash_android(['/sdcard/a'], 'sha256;reboot')
+        run.assert_not_called()
+
+
+class HashLocalTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.files = []
+        for i in range(3):
+            path = os.path.join(self.root, str(i))
+            with open(path, 'wb') as f: f.write(b'x' * (i + 1))
+            self.files.append(path)
+        self.cache = mock.patch.object(fm, '_hash_cache', fm.OrderedDict())
+        self.cache.start()
+
+    def tearDown(self):
+        self.cache.stop()
+        shutil.rmtree(self.root)
+
+    def test_cache_is_bounded(self):
+        with mock.patch.object(fm, 'HASH_CACHE_MAX', 2):
+            for path in self.files: fm.hash_local(path)
+            self.assertEqual([k[0] for k in fm._hash_cache], self.files[1:])
+            self.assertEqual(fm.hash_local(self.files[2]), (hashlib.sha256(b'xxx').hexdigest(), 0))
+
+    def test_uncached_hash_is_not_stored(self):
+        self.assertEqual(fm.hash_local(self.files[0], cache=False), (hashlib.sha256(b'x').hexdigest(), 1))
+        self.assertEqual(len(fm._hash_cache), 0)
+
+
+class VerifyPairsTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_push_lists_local_source_only(self):
+        src = os.path.join(self.root, 'src')
+        os.makedirs(os.path.join(src, 'sub'))
+        for rel in ('a', 'sub/b'):
+            with open(os.path.join(src, rel), 'w') as f: f.write(rel)
+        with mock.patch.object(fm, 'android_tree') as android_tree:
+            pairs = fm.verify_pairs('push', src, '/sdcard/src')
+        android_tree.assert_not_called()
+        self.assertEqual(sorted(pairs), [(os.path.join(src, 'a'), '/sdcard/src/a'),
+                                         (os.path.join(src, 'sub', 'b'), '/sdcard/src/sub/b')])
+
+    def test_push_single_file(self):
+        src = os.path.join(self.root, 'f')
+        open(src, 'w').close()
+        self.assertEqual(fm.verify_pairs('push', src, '/sdcard/f'), [(src, '/sdcard/f')])
+
+    def test_pull_lists_device_source(self):
+        dest = os.path.join(self.root, 'DCIM')
+        os.makedirs(dest)
+        # An unrelated file already in the destination stays out of the check
+        open(os.path.join(dest, 'old.jpg'), 'w').close()
+        tree = {'a.jpg': (1, 0), 'Camera/b.jpg': (2, 0)}
+        with mock.patch.object(fm, 'android_tree', return_value=tree) as android_tree:
+            pairs = fm.verify_pairs('pull', '/sdcard/DCIM/', dest)
+        android_tree.assert_called_once_with('/sdcard/DCIM/')
+        self.assertEqual(sorted(pairs), [(os.path.join(dest, 'Camera', 'b.jpg'), '/sdcard/DCIM/Camera/b.jpg'),
+                                         (os.path.join(dest, 'a.jpg'), '/sdcard/DCIM/a.jpg')])
+
+
+if __name__ == '__main__':
+    unittest.main()
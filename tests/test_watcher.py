@@ -0,0 +1,70 @@
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import adb_file_manager as fm
+
+
+def drain(q, until, timeout=5):
+    """Collects deltas until one satisfies `until`."""
+    seen = []
+    while True:
+        c = q.get(timeout=timeout)
+        seen.append(c)
+        if until(c): return seen
+
+
+class WatcherTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.dir = os.path.join(self.root, 'real')
+        self.alias = os.path.join(self.root, 'alias')
+        os.mkdir(self.dir)
+        os.symlink(self.dir, self.alias)
+        self.w = fm.DirWatcher()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def touch(self, name):
+        with open(os.path.join(self.dir, name), 'w') as f: f.write('x')
+
+    def test_symlink_alias_shares_watch_and_keeps_its_path(self):
+        a, b = self.w.subscribe(self.dir), self.w.subscribe(self.alias)
+        self.assertEqual(len(self.w.dirs), 1)
+        self.touch('f')
+        for q, base in ((a, self.dir), (b, self.alias)):
+            c = drain(q, lambda c: c['op'] == 'add')[-1]
+            self.assertEqual(c['file']['path'], os.path.join(base, 'f'))
+        # Dropping one alias keeps the other one's stream alive
+        self.w.unsubscribe(a)
+        self.touch('g')
+        self.assertEqual(drain(b, lambda c: c.get('file', {}).get('name') == 'g')[-1]['op'], 'add')
+        self.w.unsubscribe(b)
+        self.assertEqual((self.w.dirs, self.w.wds, self.w.subs), ({}, {}, {}))
+
+    def test_deleted_directory_ends_stream(self):
+        q = self.w.subscribe(self.alias)
+        shutil.rmtree(self.dir)
+        drain(q, lambda c: c['op'] == 'gone')
+        self.assertEqual(self.w.dirs, {})
+        self.w.unsubscribe(q)   # the handler still calls this on the way out
+
+    def test_polling_reports_deleted_directory(self):
+        self.w.fd = None
+        with mock.patch.object(fm, 'WATCH_POLL_SECONDS', 0.05):
+            q = self.w.subscribe(self.dir)
+            self.touch('f')
+            drain(q, lambda c: c['op'] == 'add')
+            shutil.rmtree(self.dir)
+            drain(q, lambda c: c['op'] == 'gone')
+        with self.assertRaises(queue.Empty): q.get(timeout=0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()